@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 
 import argparse
+import concurrent.futures
+import hashlib
 import io
 import itertools
 import json
 import os.path
+import queue
 import sqlite3
+import sys
+import threading
+import time
 
 import appdirs
 import moviepy.editor
@@ -18,56 +24,100 @@ import scipy.io.wavfile
 #
 
 
-def set_timestamps_for_video(cursor, video_path: str, timestamps: list[int]):
-    """Insert a timestamp into the database."""
+def set_timestamps_for_video(cursor, video_path: str, timestamps: list[float]):
+    """Replace the timestamps for the video."""
     cursor.execute(
         """
-        INSERT INTO video_timestamps (path, timestamps) VALUES (?, ?)
-        ON CONFLICT (path) DO UPDATE SET timestamps = excluded.timestamps
+        DELETE FROM video_steps WHERE path = ?
     """,
-        (video_path, json.dumps(timestamps).encode("utf8")),
+        (video_path,),
+    )
+    cursor.executemany(
+        """
+        INSERT INTO video_steps (path, idx, ts) VALUES (?, ?, ?)
+    """,
+        [(video_path, idx, ts) for idx, ts in enumerate(timestamps)],
     )
 
 
-def get_timestamps_for_video(cursor, video_path: str) -> list[int]:
+def get_timestamps_for_video(cursor, video_path: str) -> list[float]:
     """Return the list of all timestamps for the video."""
-    try:
-        return json.loads(
-            next(
-                cursor.execute(
-                    """
-            SELECT timestamps FROM video_timestamps WHERE path = ?
-        """,
-                    (video_path,),
-                )
-            )[0].decode("utf8")
+    return [
+        ts
+        for (ts,) in cursor.execute(
+            """
+        SELECT ts FROM video_steps WHERE path = ? ORDER BY idx
+    """,
+            (video_path,),
         )
-    except StopIteration:
-        return []
+    ]
+
+
+# Older versions stored each video's timestamps as one JSON BLOB in the
+# video_timestamps table.
+def decode_legacy_timestamps(blob: bytes) -> list[float]:
+    """Decode a timestamps BLOB from the legacy video_timestamps table."""
+    return [float(ts) for ts in json.loads(blob.decode("utf8"))]
 
 
 def init_database(cursor):
-    """Initialize the database."""
+    """Initialize the database, migrating data from older versions."""
+    # WAL avoids rewriting a rollback journal on every commit, and with WAL
+    # synchronous=NORMAL is still safe against corruption.
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    cursor.execute("PRAGMA cache_size = -8000")
+
+    # STRICT tables need SQLite 3.37.0
+    table_options = "WITHOUT ROWID"
+    if sqlite3.sqlite_version_info >= (3, 37, 0):
+        table_options += ", STRICT"
     cursor.execute(
-        """
-    CREATE TABLE IF NOT EXISTS video_timestamps (
-        path TEXT PRIMARY KEY,
-        timestamps BLOB NOT NULL
-    )
+        f"""
+    CREATE TABLE IF NOT EXISTS video_steps (
+        path TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        ts REAL NOT NULL,
+        PRIMARY KEY (path, idx)
+    ) {table_options}
     """
     )
 
+    # The legacy table is copied once and then left in place, so that older
+    # versions can still read the steps recorded with them. user_version
+    # records that the copy has been done.
+    (user_version,) = cursor.execute("PRAGMA user_version").fetchone()
+    if user_version >= 1:
+        return
+    legacy_table = cursor.execute(
+        """
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'video_timestamps'
+    """
+    ).fetchone()
+    if legacy_table is not None:
+        for video_path, blob in cursor.execute(
+            """
+            SELECT path, timestamps FROM video_timestamps
+        """
+        ).fetchall():
+            # A corrupt row only loses that video's steps
+            try:
+                timestamps = decode_legacy_timestamps(blob)
+            except (TypeError, ValueError) as e:
+                print(
+                    f"Skipping unreadable steps for {video_path}: {e}", file=sys.stderr
+                )
+                continue
+            set_timestamps_for_video(cursor, video_path, timestamps)
+    cursor.execute("PRAGMA user_version = 1")
+
 
 #
 # UI helpers
 #
 
-
-def resize_keep_aspect_ratio(original_width, original_height, new_height):
-    """Resize the (original_width, original_height) pair to have height new_height and width that maintains the same aspect ratio."""
-    aspect_ratio = original_width / original_height
-    new_width = new_height * aspect_ratio
-    return int(new_width), int(new_height)
+PROGRESS_BAR_HEIGHT = 50
 
 
 def draw_progress_bar(
@@ -78,18 +128,19 @@ def draw_progress_bar(
     screen,
     frame_idx: int,
     draw_clip: bool,
-    step_timestamps: list[int],
+    step_markers,
 ):
-    """Draw a progress bar at the bottom of the screen."""
-    progress_bar_height = 50
+    """Draw a progress bar at the bottom of the screen, with step markers from make_step_markers."""
+    progress_bar_height = PROGRESS_BAR_HEIGHT
+    screen_width, screen_height = screen.get_size()
 
     if draw_clip:
         clip_progress_percent = frame_idx / (clip_fps * (clip_end - clip_start))
-        clip_progress_bar_width = int(screen.get_width() * clip_progress_percent)
+        clip_progress_bar_width = int(screen_width * clip_progress_percent)
 
         clip_progress_bar_rect = pygame.Rect(
             0,
-            screen.get_height() - progress_bar_height,
+            screen_height - progress_bar_height,
             clip_progress_bar_width,
             progress_bar_height / 2,
         )
@@ -102,28 +153,35 @@ def draw_progress_bar(
     full_progress_percent = ((clip_fps * clip_start) + frame_idx) / (
         clip_fps * video_duration
     )
-    full_progress_bar_width = int(screen.get_width() * full_progress_percent)
+    full_progress_bar_width = int(screen_width * full_progress_percent)
 
     full_progress_bar_rect = pygame.Rect(
         0,
-        screen.get_height() - full_progress_bar_height,
+        screen_height - full_progress_bar_height,
         full_progress_bar_width,
         full_progress_bar_height,
     )
     pygame.draw.rect(screen, "red", full_progress_bar_rect)
 
-    for step in step_timestamps:
-        step_percent = step / video_duration
-        pygame.draw.rect(
-            screen,
-            "white",
-            pygame.Rect(
-                step_percent * screen.get_width(),
-                screen.get_height() - full_progress_bar_height,
-                1,
-                full_progress_bar_height,
-            ),
-        )
+    screen.blits(step_markers, doreturn=False)
+
+
+def make_step_markers(screen, video_duration, draw_clip: bool, step_timestamps):
+    """Return (surface, position) pairs that draw the step markers with a single Surface.blits call."""
+    if draw_clip:
+        full_progress_bar_height = PROGRESS_BAR_HEIGHT // 2
+    else:
+        full_progress_bar_height = PROGRESS_BAR_HEIGHT
+
+    marker = pygame.Surface((1, full_progress_bar_height))
+    marker.fill("white")
+
+    screen_width, screen_height = screen.get_size()
+    y = screen_height - full_progress_bar_height
+    marker_xs = np.multiply(
+        np.asarray(step_timestamps, dtype=np.float64), screen_width / video_duration
+    ).astype(np.int32)
+    return [(marker, (x, y)) for x in marker_xs.tolist()]
 
 
 def draw_recording_circle(screen):
@@ -132,83 +190,330 @@ def draw_recording_circle(screen):
 
 
 #
-# Main
+# Audio cache
 #
 
+AUDIO_CACHE_MAX_BYTES = 500 * 1000 * 1000
 
-def play_clip(screen, clip, step_timestamps, ui_func, event_func, repeat):
-    """Play a clip with a given UI and event handler. Optionally repeat it infinitely."""
-    running = True
+# Temporary files older than this are left over from interrupted writes
+AUDIO_CACHE_STALE_TMP_SECONDS = 60 * 60
 
-    audio_array = clip.audio.to_soundarray()
+
+def get_audio_cache_path(cache_dir, video_path: str, clip_start, clip_end) -> str:
+    """Return the path of the cached WAV for a span of the video."""
+    stat = os.stat(video_path)
+    key = json.dumps(
+        [video_path, stat.st_size, stat.st_mtime_ns, clip_start, clip_end]
+    ).encode("utf8")
+    return os.path.join(
+        cache_dir, hashlib.blake2b(key, digest_size=16).hexdigest() + ".wav"
+    )
+
+
+def encode_clip_audio(audio) -> io.BytesIO:
+    """Encode an audio clip as WAV data in memory."""
+    audio_array = audio.to_soundarray()
 
     # Normalize to fit within 16 bit signed integer. Pygame is very picky about its WAVs.
     audio_normalized = np.int16(audio_array / np.max(np.abs(audio_array)) * 32767)
 
-    # Create a BytesIO object to hold the WAV data
     audio_io = io.BytesIO()
-
-    # Fill the BytesIO object and seek back
-    sample_rate = int(clip.audio.fps)
+    sample_rate = int(audio.fps)
     scipy.io.wavfile.write(audio_io, sample_rate, audio_normalized)
     audio_io.seek(0)
+    return audio_io
+
+
+def write_clip_audio(audio, audio_path: str) -> io.BytesIO:
+    """Write an audio clip to a WAV file, and return the same WAV data in memory."""
+    # Encode the WAV in memory, so that it can be played without reading
+    # the file back from disk
+    audio_io = encode_clip_audio(audio)
+
+    # Write to a temporary file and rename it into place, so that an
+    # interrupted write never leaves a truncated WAV in the cache.
+    tmp_path = f"{audio_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(audio_io.getbuffer())
+    os.replace(tmp_path, audio_path)
+
+    return audio_io
+
+
+def prefetch_clip_audio(video_path: str, clip_start, clip_end, audio_path: str):
+    """Write a span of the video's audio to the cache, unless it is already there."""
+    if os.path.exists(audio_path):
+        return
+    # Use a reader of our own, so that this can run alongside playback
+    audio = moviepy.editor.AudioFileClip(video_path)
+    try:
+        write_clip_audio(audio.subclip(clip_start, clip_end), audio_path)
+    finally:
+        audio.close()
+
+
+def evict_audio_cache(cache_dir, max_bytes: int):
+    """Delete the least recently used WAVs until the cache fits in max_bytes, and any stale temporary files."""
+    stale_tmp_mtime = time.time() - AUDIO_CACHE_STALE_TMP_SECONDS
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if entry.name.endswith(".wav"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            elif entry.name.endswith(".tmp"):
+                # Recent ones may still be written by another instance
+                if entry.stat().st_mtime < stale_tmp_mtime:
+                    os.remove(entry.path)
+
+    total_bytes = 0
+    for _, size, path in sorted(entries, reverse=True):
+        total_bytes += size
+        if total_bytes > max_bytes:
+            os.remove(path)
+
+
+#
+# Frame decoding
+#
+
+FRAME_CACHE_MAX_BYTES = 500 * 1000 * 1000
+
+
+def frame_to_surface(frame):
+    """Convert a decoded video frame into a pygame surface."""
+    # Frames are height x width x RGB, which matches the layout pygame
+    # expects for an "RGB" buffer, so the surface can wrap the frame directly.
+    frame = np.ascontiguousarray(frame)
+    return pygame.image.frombuffer(frame, (frame.shape[1], frame.shape[0]), "RGB")
+
+
+def put_until_stopped(frame_queue, item, stop_event) -> bool:
+    """Put item on the queue, giving up if stop_event is set while waiting. Return whether the item was queued."""
+    while not stop_event.is_set():
+        try:
+            frame_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def produce_frame_surfaces(frame_generator, frame_queue, stop_event, frame_cache=None):
+    """Convert frames to surfaces and queue them as (frame_idx, surface) pairs, followed by a None sentinel.
+
+    If frame_cache is given, frames are also copied into it, and the surfaces wrap the cached copies.
+    If decoding fails, the exception is queued instead, so that the consumer can re-raise it.
+    """
+    try:
+        for i, frame in enumerate(frame_generator):
+            if frame_cache is not None and i < len(frame_cache):
+                frame_cache[i] = frame
+                frame = frame_cache[i]
+            item = (i, frame_to_surface(frame))
+            if not put_until_stopped(frame_queue, item, stop_event):
+                return
+    except BaseException as e:
+        put_until_stopped(frame_queue, e, stop_event)
+        return
+    put_until_stopped(frame_queue, None, stop_event)
+
+
+#
+# Main
+#
 
-    # Load the WAV data from the BytesIO object into pygame mixer music
-    pygame.mixer.music.load(audio_io)
+HANDLED_EVENT_TYPES = [pygame.QUIT, pygame.KEYDOWN]
+
+RECORD_STEP_KEYS = frozenset([pygame.K_SPACE, pygame.K_RETURN])
+
+# Keys that change the step in play steps mode, mapped to the step delta
+PLAY_STEP_DELTA_KEYS = {
+    # next clip
+    pygame.K_RETURN: 1,
+    pygame.K_SPACE: 1,
+    pygame.K_RIGHT: 1,
+    pygame.K_j: 1,
+    pygame.K_l: 1,
+    # prev clip
+    pygame.K_LEFT: -1,
+    pygame.K_k: -1,
+    pygame.K_h: -1,
+    # restart current clip
+    pygame.K_0: 0,
+    pygame.K_BACKSPACE: 0,
+}
+
+
+def play_clip(
+    screen,
+    clip,
+    audio_path,
+    step_timestamps,
+    ui_func,
+    event_func,
+    repeat,
+    audio_prefetch=None,
+):
+    """Play a clip with a given UI and event handler. Optionally repeat it infinitely.
 
-    ms_per_frame = 1000 / clip.fps
+    The event handler is called with the events to handle, and returns (running, paused, step_delta).
 
-    # This is used to dynamically correct for any audio/video syncing
-    # issues that arise, since we're playing those separately.
-    current_video_delay_ms = 0
+    The clip's audio is read from the WAV at audio_path, which is written first if it does not exist yet.
+    If audio_path is None, the audio is only kept in memory.
+    If audio_prefetch is a future that is writing audio_path, it is waited for instead.
+    """
+    running = True
+
+    # Let an in-flight prefetch finish rather than extract the same audio
+    # twice. If it was cancelled or failed, the audio is extracted below.
+    if audio_prefetch is not None:
+        concurrent.futures.wait([audio_prefetch])
+
+    # Extracting the audio is slow, so it is cached on disk and reused
+    # whenever the same span of the video is played again.
+    if audio_path is None:
+        pygame.mixer.music.load(encode_clip_audio(clip.audio))
+    elif os.path.exists(audio_path):
+        # Mark the WAV as recently used for cache eviction
+        os.utime(audio_path)
+        pygame.mixer.music.load(audio_path)
+    else:
+        pygame.mixer.music.load(write_clip_audio(clip.audio, audio_path))
+
+    # Bind everything used per frame to locals, to skip attribute lookups
+    # in the hot loop.
+    fps = clip.fps
+    ms_per_frame = 1000 / fps
+    blit = screen.blit
+    flip = pygame.display.flip
+    update = pygame.display.update
+    get_audio_ms = pygame.mixer.music.get_pos
+
+    # Repeated clips that fit in memory are decoded once, and then replayed
+    # from the cached frames instead of running ffmpeg again on every repeat.
+    # One spare frame allows for rounding in the frame count.
+    width, height = clip.size
+    frame_count = int(np.ceil(clip.duration * fps)) + 1
+    if repeat and frame_count * height * width * 3 <= FRAME_CACHE_MAX_BYTES:
+        frame_cache = np.empty((frame_count, height, width, 3), dtype=np.uint8)
+    else:
+        frame_cache = None
+    cached_frames = None
+
+    # Only the frame and the progress bar change from one frame to the next,
+    # so only those areas are pushed to the display. The recording circle is
+    # drawn inside the frame area.
+    screen_width, screen_height = screen.get_size()
+    progress_bar_rect = pygame.Rect(
+        0, screen_height - PROGRESS_BAR_HEIGHT, screen_width, PROGRESS_BAR_HEIGHT
+    )
+    dirty_rects = [pygame.Rect(0, 0, width, height), progress_bar_rect]
+
+    # The margins around the frame stay the same for the whole clip, so the
+    # full screen only needs to be cleared and pushed once.
+    screen.fill((0, 0, 0))
+    needs_full_update = True
 
     while True:
         # This resets the progress bars
-        screen.fill((0, 0, 0))
+        screen.fill((0, 0, 0), progress_bar_rect)
 
-        frame_generator = clip.iter_frames(fps=clip.fps, dtype="uint8")
-
-        # The first frame takes a lot longer to generate. Probably,
-        # clip.itertools is being a little too lazy. This is a workaround
-        # to generate the first frame eagerly. Otherwise, we'll drop too
-        # many frames at the start.
-        frame_generator = itertools.chain([next(frame_generator)], frame_generator)
+        if cached_frames is not None:
+            frame_generator = iter(cached_frames)
+        else:
+            frame_generator = clip.iter_frames(fps=fps, dtype="uint8")
+
+            # The first frame takes a lot longer to generate. Probably,
+            # clip.itertools is being a little too lazy. This is a workaround
+            # to generate the first frame eagerly. Otherwise, we'll drop too
+            # many frames at the start.
+            frame_generator = itertools.chain([next(frame_generator)], frame_generator)
+
+        # Decoding and converting frames happens on a producer thread, so
+        # that the main loop only has to blit ready surfaces.
+        frame_queue = queue.Queue(maxsize=4)
+        stop_event = threading.Event()
+        producer = threading.Thread(
+            target=produce_frame_surfaces,
+            args=(frame_generator, frame_queue, stop_event, frame_cache),
+            daemon=True,
+        )
+        producer.start()
 
-        clock = pygame.time.Clock()
+        get_frame = frame_queue.get
         pygame.mixer.music.play()
 
-        for i, frame in enumerate(frame_generator):
-            # Correct for syncing issues by dropping frames or waiting
-            if current_video_delay_ms > ms_per_frame:
-                current_video_delay_ms -= ms_per_frame
-                continue
+        finished = False
+        while True:
+            item = get_frame()
+            if item is None:
+                finished = True
+                break
+            if isinstance(item, BaseException):
+                raise item
+            i, frame_surface = item
+
+            # Video and audio are played separately, so the audio position
+            # is the clock that decides which frame should be on screen.
+            audio_ms = get_audio_ms()
+            drop_frame = False
+            if audio_ms >= 0:
+                if i < int(audio_ms * fps / 1000):
+                    # Behind the audio, so drop this frame if a newer one is
+                    # already waiting. If decoding is slower than the clip,
+                    # show what we have rather than dropping every frame.
+                    drop_frame = not frame_queue.empty()
+                else:
+                    # Wait for the audio to reach this frame
+                    wait_ms = i * ms_per_frame - audio_ms
+                    if wait_ms > 0:
+                        time.sleep(wait_ms / 1000)
             else:
-                while current_video_delay_ms < -1 * ms_per_frame:
-                    current_video_delay_ms += clock.tick(clip.fps)
-
-            frame_surface = pygame.surfarray.make_surface(frame.swapaxes(0, 1))
-            screen.blit(frame_surface, (0, 0))
-            ui_func(screen, clip, step_timestamps, i)
-            pygame.display.flip()
+                # The audio has finished, so fall back to the nominal frame rate
+                time.sleep(ms_per_frame / 1000)
+
+            if not drop_frame:
+                blit(frame_surface, (0, 0))
+                ui_func(screen, clip, step_timestamps, i)
+                if needs_full_update:
+                    flip()
+                    needs_full_update = False
+                else:
+                    update(dirty_rects)
 
             running, paused, step_delta = event_func(
-                clock, clip, step_timestamps, i, paused=False
+                pygame.event.get(HANDLED_EVENT_TYPES),
+                clip,
+                step_timestamps,
+                i,
+                paused=False,
             )
             was_paused = paused
             if paused:
                 pygame.mixer.music.pause()
             while paused and running:
-                running, paused, step_delta = event_func(
-                    clock, clip, step_timestamps, i, paused=True
-                )
-                clock.tick(clip.fps)
+                # Sleep until an event arrives instead of polling for one
+                event = pygame.event.wait(100)
+                if event.type != pygame.NOEVENT:
+                    running, paused, step_delta = event_func(
+                        [event], clip, step_timestamps, i, paused=True
+                    )
             if was_paused:
                 pygame.mixer.music.unpause()
 
             if not running or step_delta is not None:
                 break
-            else:
-                current_video_delay_ms += clock.tick(clip.fps) - ms_per_frame
+
+        # The producer shares the clip's reader, so it must be finished
+        # before the clip is iterated again.
+        stop_event.set()
+        producer.join()
+
+        # Only a pass that decoded every frame leaves a usable cache
+        if frame_cache is not None and finished and i < len(frame_cache):
+            cached_frames = frame_cache[: i + 1]
+            frame_cache = None
 
         if not repeat or not running or step_delta in [-1, 1]:
             break
@@ -216,11 +521,23 @@ def play_clip(screen, clip, step_timestamps, ui_func, event_func, repeat):
     return running, step_delta
 
 
+def get_step_bounds(step_timestamps, step_idx: int, video_duration):
+    """Return the (start, end) times of the step at step_idx."""
+    clip_start = step_timestamps[step_idx]
+    clip_end = (
+        step_timestamps[step_idx + 1]
+        if step_idx + 1 < len(step_timestamps)
+        else int(video_duration)
+    )
+    return clip_start, clip_end
+
+
 def main():
     """Entrypoint for CLI."""
     data_dir = appdirs.AppDirs("vidsteps", "dhashe").user_data_dir
     os.makedirs(data_dir, mode=0o755, exist_ok=True)
     db_filename = os.path.join(data_dir, "data.sqlite")
+    audio_cache_dir = os.path.join(data_dir, "audio_cache")
 
     parser = argparse.ArgumentParser(description="Play a video one step at a time.")
     parser.add_argument(
@@ -234,35 +551,61 @@ def main():
 
     video_path = os.path.realpath(args.video_file)
 
-    with sqlite3.connect(db_filename) as conn:
-        cursor = conn.cursor()
-        init_database(cursor)
-        if args.record:
-            step_timestamps = []
-        else:
-            step_timestamps = get_timestamps_for_video(cursor, video_path)
+    os.makedirs(audio_cache_dir, mode=0o755, exist_ok=True)
+    evict_audio_cache(audio_cache_dir, AUDIO_CACHE_MAX_BYTES)
 
-    video = moviepy.editor.VideoFileClip(video_path)
+    conn = sqlite3.connect(db_filename)
+    try:
+        play_video(conn, video_path, audio_cache_dir, args.record)
+    finally:
+        conn.close()
+
+
+def play_video(conn, video_path: str, audio_cache_dir, record: bool):
+    """Record steps for the video if needed, then play it step by step."""
+    cursor = conn.cursor()
+    with conn:
+        init_database(cursor)
+    if record:
+        step_timestamps = []
+    else:
+        step_timestamps = get_timestamps_for_video(cursor, video_path)
 
     pygame.init()
     pygame.mixer.init()
 
+    # Keep SDL from queueing events we never handle, like mouse motion
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(HANDLED_EVENT_TYPES)
+
     display_info = pygame.display.Info()
     screen = pygame.display.set_mode(
-        (display_info.current_w * 0.9, display_info.current_h * 0.9 + 50)
+        (
+            display_info.current_w * 0.9,
+            display_info.current_h * 0.9 + PROGRESS_BAR_HEIGHT,
+        )
     )
     pygame.display.set_caption("vidsteps: " + os.path.basename(video_path))
-    video = video.resize(
-        new_size=resize_keep_aspect_ratio(
-            video.size[0], video.size[1], display_info.current_h * 0.9
-        )
+
+    # Let ffmpeg scale the frames while decoding, rather than resizing each
+    # decoded frame afterwards. target_resolution is (height, width), and a
+    # width of None keeps the aspect ratio.
+    video = moviepy.editor.VideoFileClip(
+        video_path, target_resolution=(int(display_info.current_h * 0.9), None)
     )
 
     running = True
 
     if len(step_timestamps) == 0:
         # record steps mode
+        record_step_markers = []
+
         def record_ui_func(screen, clip, step_timestamps, frame_idx):
+            # Steps are added while recording, so rebuild the markers when they change
+            if len(record_step_markers) != len(step_timestamps):
+                record_step_markers[:] = make_step_markers(
+                    screen, clip.duration, False, step_timestamps
+                )
             draw_progress_bar(
                 clip.fps,
                 0,
@@ -271,13 +614,13 @@ def main():
                 screen,
                 frame_idx,
                 False,
-                step_timestamps,
+                record_step_markers,
             )
             draw_recording_circle(screen)
 
-        def record_event_func(clock, clip, step_timestamps, frame_idx, paused):
+        def record_event_func(events, clip, step_timestamps, frame_idx, paused):
             running = True
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == pygame.QUIT:
                     running = False
                 elif event.type == pygame.KEYDOWN:
@@ -285,7 +628,7 @@ def main():
                     if event.key == pygame.K_p:
                         # pause / unpause
                         paused = not paused
-                    elif event.key in [pygame.K_SPACE, pygame.K_RETURN]:
+                    elif event.key in RECORD_STEP_KEYS:
                         # record step here
                         step_timestamps.append(frame_idx / clip.fps)
                     elif (event.key == pygame.K_c and (mods & pygame.KMOD_CTRL)) or (
@@ -299,6 +642,9 @@ def main():
         running, _ = play_clip(
             screen,
             video,
+            # Play mode never plays the whole video, so caching it would only
+            # push the step WAVs out of the cache
+            None,
             step_timestamps,
             record_ui_func,
             record_event_func,
@@ -306,18 +652,19 @@ def main():
         )
 
         if running:
-            with sqlite3.connect(db_filename) as conn:
-                cursor = conn.cursor()
+            with conn:
                 set_timestamps_for_video(cursor, video_path, step_timestamps)
 
     # play steps mode
+    play_step_markers = make_step_markers(screen, video.duration, True, step_timestamps)
+    # One worker extracts upcoming audio in the background. Futures are kept
+    # by WAV path, so that the same audio is never extracted twice at once.
+    prefetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    prefetches = {}
     step_idx = 0
     while running and step_idx < len(step_timestamps):
-        clip_start = step_timestamps[step_idx]
-        clip_end = (
-            step_timestamps[step_idx + 1]
-            if step_idx + 1 < len(step_timestamps)
-            else int(video.duration)
+        clip_start, clip_end = get_step_bounds(
+            step_timestamps, step_idx, video.duration
         )
 
         def play_ui_func(screen, clip, step_timestamps, frame_idx):
@@ -329,35 +676,23 @@ def main():
                 screen,
                 frame_idx,
                 True,
-                step_timestamps,
+                play_step_markers,
             )
 
-        def play_event_func(clock, clip, step_timestamps, frame_idx, paused):
+        def play_event_func(events, clip, step_timestamps, frame_idx, paused):
             running = True
             step_delta = None
-            for event in pygame.event.get():
+            for event in events:
                 if event.type == pygame.QUIT:
                     running = False
                 elif event.type == pygame.KEYDOWN:
                     mods = pygame.key.get_mods()
-                    if event.key in [
-                        pygame.K_RETURN,
-                        pygame.K_SPACE,
-                        pygame.K_RIGHT,
-                        pygame.K_j,
-                        pygame.K_l,
-                    ]:
-                        # next clip
-                        step_delta = 1
-                    elif event.key in [pygame.K_LEFT, pygame.K_k, pygame.K_h]:
-                        # prev clip
-                        step_delta = -1
+                    if event.key in PLAY_STEP_DELTA_KEYS:
+                        # next / prev / restart clip
+                        step_delta = PLAY_STEP_DELTA_KEYS[event.key]
                     elif event.key == pygame.K_p:
                         # pause / unpause
                         paused = not paused
-                    elif event.key in [pygame.K_0, pygame.K_BACKSPACE]:
-                        # restart current clip
-                        step_delta = 0
                     elif (event.key == pygame.K_c and (mods & pygame.KMOD_CTRL)) or (
                         event.key == pygame.K_q
                     ):
@@ -372,12 +707,51 @@ def main():
             running = False
             break
 
+        audio_path = get_audio_cache_path(
+            audio_cache_dir, video_path, clip_start, clip_end
+        )
+        # A prefetch of this step's audio that hasn't started yet is
+        # cancelled, since extracting it here is no slower. One that is
+        # running is waited for by play_clip.
+        audio_prefetch = prefetches.pop(audio_path, None)
+        if audio_prefetch is not None:
+            audio_prefetch.cancel()
+
+        # Extract the next step's audio while this one plays, so that moving
+        # on to it doesn't stall. Queued prefetches for other steps are no
+        # longer needed.
+        next_audio_path = None
+        if step_idx + 1 < len(step_timestamps):
+            next_start, next_end = get_step_bounds(
+                step_timestamps, step_idx + 1, video.duration
+            )
+            next_audio_path = get_audio_cache_path(
+                audio_cache_dir, video_path, next_start, next_end
+            )
+        for path, future in list(prefetches.items()):
+            if future.done() or (path != next_audio_path and future.cancel()):
+                del prefetches[path]
+        if next_audio_path is not None and next_audio_path not in prefetches:
+            prefetches[next_audio_path] = prefetch_executor.submit(
+                prefetch_clip_audio, video_path, next_start, next_end, next_audio_path
+            )
+
         running, step_delta = play_clip(
-            screen, clip, step_timestamps, play_ui_func, play_event_func, repeat=True
+            screen,
+            clip,
+            audio_path,
+            step_timestamps,
+            play_ui_func,
+            play_event_func,
+            repeat=True,
+            audio_prefetch=audio_prefetch,
         )
         step_idx += step_delta or 0
         step_idx = max(step_idx, 0)
 
+    # Drop queued prefetches, and let a running one finish rather than leave
+    # a partial WAV behind
+    prefetch_executor.shutdown(wait=True, cancel_futures=True)
     pygame.quit()
 
 